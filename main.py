@@ -1,40 +1,122 @@
+import os
+import re
 import sys
+import heapq
 import argparse
 from collections import Counter
-from typing import List, Dict, Callable, Generator, Union, Tuple, Any
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from multiprocessing.shared_memory import SharedMemory
+from operator import itemgetter
+from typing import List, Dict, Callable, Iterator, Union, Tuple, Any
 
-from utils import load_json, save_json, plot_dna_dataset, plot_dnt_confmat
+import numpy as np
 
+from utils import load_json, save_json, stream_json, plot_dna_dataset, plot_dnt_confmat
 
-def substrings(seq: str, win_len: int, hop_len: int) -> Generator:
+# Reserved ID for any byte that is not one of the valid nucleobases
+INVALID_BASE_ID = 255
+
+# K-mers are counted in a table indexed by their packed ID while the table
+# needs at most this many entries, e.g. up to k = 10 for A, C, G, T, and
+# is no more than a few times larger than the number of k-mers to count
+DENSE_K_MER_MAX_IDS = 1 << 20
+DENSE_K_MER_MAX_FILL = 8
+
+# Sequences up to this length are scanned for invalid bases with a regex,
+# which is faster than NumPy until the cost of setting up arrays pays off
+REGEX_SCAN_MAX_LEN = 2048
+
+# Per-process state of the pool workers used by `iterate_foreach`
+_worker_state: Dict = {}
+
+
+def as_bytes(sequence: Union[str, np.ndarray]) -> np.ndarray:
     """
-    Moves a sliding window over a DNA sequence to generate
-    substrings of a given length at a given interval.
+    Views a DNA sequence as an array of its ASCII byte values. Arrays are
+    passed through untouched, so a sequence can be converted once and
+    shared between several analyses. Any non-ASCII characters still take
+    up a single byte, so that they can be treated as invalid bases.
 
     Args:
-        seq (str): The sequence to move the window over
-        win_len (int): The length of the K-mer
-        hop_len (int): Distance to move the window for next K-mer
+        sequence (Union[str, np.ndarray]): The DNA sequence, either as a
+        string or as an array already returned by this function
 
-    Yields:
-        Generator: The next K-mer in the sequence
+    Returns:
+        np.ndarray: A uint8 array with one entry per nucleobase
+    """
+    if isinstance(sequence, np.ndarray):
+        return sequence
+    if sequence.isascii():
+        return np.frombuffer(sequence.encode("ascii"), dtype=np.uint8)
+    # Keep one byte per character so positions still line up. Characters
+    # beyond Latin-1 become 0xFF, which is never a valid base
+    code_points = np.frombuffer(sequence.encode("utf-32-le"), dtype=np.uint32)
+    return np.minimum(code_points, 0xFF).astype(np.uint8)
+
+
+@lru_cache(maxsize=None)
+def base_id_lookup(valid_bases: Tuple[str, ...]) -> np.ndarray:
+    """
+    Builds a table that maps every byte value to the position of that
+    character in `valid_bases`, so that a whole sequence can be encoded
+    with a single indexing operation. Cached, as the valid bases rarely
+    change between calls.
+
+    Args:
+        valid_bases (Tuple[str, ...]): Characters representing the valid nucleobases
+
+    Returns:
+        np.ndarray: A read-only 256-entry table of base IDs, where any byte
+        that is not a valid base maps to `INVALID_BASE_ID`
+    """
+    lookup = np.full(256, INVALID_BASE_ID, dtype=np.uint8)
+    for base_id, base in enumerate(valid_bases):
+        lookup[ord(base)] = base_id
+    lookup.flags.writeable = False
+    return lookup
+
+
+@lru_cache(maxsize=None)
+def dinucleotide_keys(valid_bases: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Lists every pairing of the valid nucleobases, ordered to match the
+    IDs used by `get_dinucleotide_freqs`. Cached, so the pairs are only
+    built once per set of valid bases rather than once per sequence.
+
+    Args:
+        valid_bases (Tuple[str, ...]): Characters representing the valid nucleobases
+
+    Returns:
+        Tuple[str, ...]: All dinucleotides that can be made from the valid bases
     """
-    seq_len = len(seq)
-    for i in range(0, seq_len, hop_len):
-        substring = seq[i : i + win_len]
-        if len(substring) != win_len:
-            break  # We have overshot the length of the sequence
-        yield substring
+    return tuple(i + j for i in valid_bases for j in valid_bases)
 
 
-def get_gc_stats(sequence: str, valid_nucleobases: Union[List, None] = None) -> Dict:
+@lru_cache(maxsize=None)
+def invalid_base_pattern(valid_bases: Tuple[str, ...]) -> re.Pattern:
+    """
+    Compiles a regex matching any single character that is not a
+    valid nucleobase. Cached, as the valid bases rarely change between calls.
+
+    Args:
+        valid_bases (Tuple[str, ...]): Characters representing the valid nucleobases
+
+    Returns:
+        re.Pattern: The compiled pattern
+    """
+    return re.compile("[^" + "".join(re.escape(base) for base in valid_bases) + "]")
+
+
+def get_gc_stats(sequence: Union[str, np.ndarray], valid_nucleobases: Union[List, None] = None) -> Dict:
     """
     Returns some GC-related stats for a single DNA sequence. Calculates:
         - The GC distribution
         - GC skew
 
     Args:
-        sequence (str): The DNA sequence to analyse
+        sequence (Union[str, np.ndarray]): The DNA sequence to analyse, as a
+        string or as an array from `as_bytes`
         valid_nucleobases (List, optional): List of characters
         representing the valid nucleobases. Any other bases are ignored
         for the purposes of statistical calculations. If None, all bases found in the
@@ -43,14 +125,16 @@ def get_gc_stats(sequence: str, valid_nucleobases: Union[List, None] = None) ->
     Returns:
         Dict: Object with all stats for the sequence
     """
+    # Count every byte value in one pass, then read off the bases we need
+    seq_bytes = as_bytes(sequence)
+    base_counts = np.bincount(seq_bytes, minlength=256)
     if valid_nucleobases is None:
-        total_valid = len(sequence)
+        total_valid = len(seq_bytes)
     else:
-        num_invalid = len([base for base in sequence if base not in valid_nucleobases])
-        total_valid = len(sequence) - num_invalid
+        total_valid = int(sum(base_counts[ord(base)] for base in set(valid_nucleobases)))
 
-    num_c = sequence.count("C")
-    num_g = sequence.count("G")
+    num_c = int(base_counts[ord("C")])
+    num_g = int(base_counts[ord("G")])
     gc_distribution = (num_c + num_g) / total_valid
     gc_skew = (num_g - num_c) / (num_g + num_c)
 
@@ -59,50 +143,115 @@ def get_gc_stats(sequence: str, valid_nucleobases: Union[List, None] = None) ->
     return gc_stats
 
 
-def get_dinucleotide_freqs(sequence: str, valid_bases: List) -> Dict:
+def get_dinucleotide_freqs(sequence: Union[str, np.ndarray], valid_bases: List) -> Dict:
     """
     Finds the frequency of all 2-mers in a single DNA sequence
     Args:
-        sequence (str): The DNA sequence to analyse
+        sequence (Union[str, np.ndarray]): The DNA sequence to analyse, as a
+        string or as an array from `as_bytes`
 
     Returns:
         Dict: Object with all stats for the sequence
     """
-    valid_dinucleotides = [
-        i + j
-        for i in valid_bases
-        for j in valid_bases
-    ]
-    dinucleotide_counts = {d: 0 for d in valid_dinucleotides}
-    dinucleotides = substrings(sequence, win_len=2, hop_len=2)
-    for d in dinucleotides:
-        if d in dinucleotide_counts.keys():
-            dinucleotide_counts[d] += 1
-    total_dinucleotides = sum(dinucleotide_counts.values())
+    bases = tuple(valid_bases)
+    num_bases = len(bases)
+    lookup = base_id_lookup(bases)
+    base_ids = lookup[as_bytes(sequence)]
+
+    # Dinucleotides are read in non-overlapping pairs, so drop any trailing
+    # base and only count pairs where both bases are valid
+    pairs = base_ids[: len(base_ids) // 2 * 2].reshape(-1, 2)
+    pairs = pairs[(pairs != INVALID_BASE_ID).all(axis=1)]
+    pair_ids = pairs[:, 0].astype(np.intp) * num_bases + pairs[:, 1]
+    dinucleotide_counts = np.bincount(pair_ids, minlength=num_bases * num_bases)
+
+    total_dinucleotides = int(dinucleotide_counts.sum())
     dinucleotide_frac = {
-        d: count / total_dinucleotides for d, count in dinucleotide_counts.items()
+        d: count / total_dinucleotides
+        for d, count in zip(dinucleotide_keys(bases), dinucleotide_counts.tolist())
     }
     return dinucleotide_frac
 
 
-def find_invalid_bases(sequence: str, valid_bases: List) -> Dict:
+def find_invalid_bases(sequence: Union[str, np.ndarray], valid_bases: List) -> Dict:
     """
     Finds the positions of all invalid bases in a single DNA sequences,
     as defined in the settings.
     Args:
-        sequence (str): The DNA sequence to analyse
+        sequence (Union[str, np.ndarray]): The DNA sequence to analyse, as a
+        string or as an array from `as_bytes`
 
     Returns:
         Dict: Object with all stats for the sequence
     """
-    invalid_dict: Dict = {"num_invalid": 0, "invalid_bases": []}
-    for pos, base in enumerate(sequence):
-        if base not in  valid_bases:
-            invalid_dict["num_invalid"] += 1
-            invalid_dict["invalid_bases"].append({"pos": pos, "base": base})
+    # Non-ASCII characters have no byte value of their own, so those
+    # sequences are always scanned as strings
+    if len(sequence) <= REGEX_SCAN_MAX_LEN or (
+        isinstance(sequence, str) and not sequence.isascii()
+    ):
+        if isinstance(sequence, np.ndarray):
+            sequence = sequence.tobytes().decode("latin-1")
+        pattern = invalid_base_pattern(tuple(valid_bases))
+        invalid_bases = [
+            {"pos": match.start(), "base": match.group()}
+            for match in pattern.finditer(sequence)
+        ]
+        return {"num_invalid": len(invalid_bases), "invalid_bases": invalid_bases}
+
+    lookup = base_id_lookup(tuple(valid_bases))
+    seq_bytes = as_bytes(sequence)
+    positions = np.flatnonzero(lookup[seq_bytes] == INVALID_BASE_ID)
+    bases = seq_bytes[positions].tobytes().decode("latin-1")
+    invalid_dict: Dict = {
+        "num_invalid": len(positions),
+        "invalid_bases": [
+            {"pos": pos, "base": base} for pos, base in zip(positions.tolist(), bases)
+        ],
+    }
     return invalid_dict
 
 
+def manacher(seq: str) -> Tuple[List[int], List[int]]:
+    """
+    Computes the radius of the longest palindrome centred at every
+    position of a sequence using Manacher's algorithm, in O(n) time.
+
+    Args:
+        seq (str): The sequence to analyse
+
+    Returns:
+        Tuple[List[int], List[int]]: Two lists `d1` and `d2`. `d1[i]` is the
+        number of odd-length palindromes centred on `seq[i]`, so the longest
+        is `seq[i - d1[i] + 1 : i + d1[i]]`. `d2[i]` is the number of
+        even-length palindromes centred between `seq[i - 1]` and `seq[i]`,
+        so the longest is `seq[i - d2[i] : i + d2[i]]`.
+    """
+    n = len(seq)
+
+    d1 = [0] * n
+    left, right = 0, -1  # Bounds of the rightmost palindrome found so far
+    for i in range(n):
+        # Reuse the radius of the mirrored centre inside the known palindrome
+        k = 1 if i > right else min(d1[left + right - i], right - i + 1)
+        while i - k >= 0 and i + k < n and seq[i - k] == seq[i + k]:
+            k += 1
+        d1[i] = k
+        if i + k - 1 > right:
+            left, right = i - k + 1, i + k - 1
+
+    d2 = [0] * n
+    left, right = 0, -1
+    for i in range(n):
+        k = 0 if i > right else min(d2[left + right - i + 1], right - i + 1)
+        while i - k - 1 >= 0 and i + k < n and seq[i - k - 1] == seq[i + k]:
+            k += 1
+        d2[i] = k
+        if i + k - 1 > right:
+            left, right = i - k, i + k - 1
+
+    return d1, d2
+
+
 def find_palindromes(sequence: str, min_substring_len: int, min_bases: int) -> Dict:
     """
     Finds palindromes of a minimum length and nucleobase count
@@ -120,36 +269,181 @@ def find_palindromes(sequence: str, min_substring_len: int, min_bases: int) -> D
         each palindrome found.
     """
     palindrome_stats: Dict = {"num_palindromes": 0, "palindromes": []}
+    palindromes = palindrome_stats["palindromes"]
+    d1, d2 = manacher(sequence)
 
-    def expand_frontier(start: int, end: int):
+    def contract_frontier(centre: int, max_radius: int, odd: bool):
         """
-        Iterate through the sequence, treating each character (or pair
-        of characters) as the centre of a possible palindrome. Keep 
-        expanding outwards from the centre until a boundary is reached
-        on either side of the sequence. Only add to the list of palindromes
-        if long enough and contains enough unique bases.
+        Report the sub-palindromes sharing a centre, up to the radius of
+        the longest palindrome found there by Manacher's algorithm. Radii
+        too short to meet the minimum length are skipped, and each further
+        step adds one (mirrored) base, so the unique bases are tracked
+        incrementally rather than recounted for every sub-palindrome.
+        Only add to the list of palindromes if long enough and contains
+        enough unique bases.
         """
-        while start >= 0 and end < len(sequence) and sequence[start] == sequence[end]:
-            substring = sequence[start : end + 1]
-            if (
-                len(substring) >= min_substring_len
-                and len(Counter(substring)) >= min_bases
-            ):
-                palindrome_stats["num_palindromes"] += 1
-                palindrome_stats["palindromes"].append(
-                    {"pos": start, "length": len(substring)}
-                )
-            start -= 1
-            end += 1
-
+        min_radius = min_odd_radius if odd else min_even_radius
+        left = centre + 1 - min_radius if odd else centre - min_radius
+        # Palindromes are mirrored, so the left half holds every unique base
+        seen = set(sequence[left : centre + 1])
+        for radius in range(min_radius, max_radius + 1):
+            seen.add(sequence[left])
+            if len(seen) >= min_bases:
+                length = 2 * radius - 1 if odd else 2 * radius
+                palindromes.append({"pos": left, "length": length})
+            left -= 1
+
+    # Shortest radii that meet the minimum length. Most centres fall short
+    # of these, so they are skipped without walking the frontier at all
+    min_odd_radius = max(1, (min_substring_len + 2) // 2)
+    min_even_radius = max(1, (min_substring_len + 1) // 2)
     for i in range(len(sequence)):
-        expand_frontier(i, i)  # Find odd-numbered palindromes
-        expand_frontier(i, i + 1)  # Find even-numbered palindromes
+        if d1[i] >= min_odd_radius:
+            contract_frontier(i, d1[i], odd=True)  # Find odd-numbered palindromes
+        if i + 1 < len(sequence) and d2[i + 1] >= min_even_radius:
+            contract_frontier(i + 1, d2[i + 1], odd=False)  # Find even-numbered palindromes
+
+    palindrome_stats["num_palindromes"] = len(palindromes)
+    return palindrome_stats
+
+
+def find_distinct_palindromes(
+    sequence: str, min_substring_len: int, min_bases: int
+) -> Dict:
+    """
+    Finds each distinct palindrome of a minimum length and nucleobase
+    count in a single DNA sequence, along with how often it occurs.
+    Builds a palindromic tree (Eertree), which holds one node per distinct
+    palindrome and is built in a single pass over the sequence.
+
+    Args:
+        sequence (str): The DNA sequence to analyse
+        min_substring_len (int): Minimum length of the palindromic sequence
+        min_bases (int): Minimum number of nucleobases that must be present 
+        in the palindrome
+
+    Returns:
+        Dict: Object with all stats for the sequence. The position of the
+        first occurrence, the length and the number of occurrences are
+        reported for each distinct palindrome found.
+    """
+    # Node 0 is the imaginary root of length -1, node 1 the empty palindrome.
+    # Each node also keeps a bitmask of the bases it contains
+    lengths = [-1, 0]
+    suffix_links = [0, 0]
+    transitions: List[Dict] = [{}, {}]
+    base_masks = [0, 0]
+    first_ends = [-1, -1]
+    occurrences = [0, 0]
+    base_bits: Dict[str, int] = {}
+
+    def find_extendable(node: int, end: int) -> int:
+        """
+        Follow suffix links from a node until reaching a palindrome that
+        is wrapped by the same base on both sides when the base at `end`
+        is appended.
+        """
+        while True:
+            start = end - lengths[node] - 1
+            if start >= 0 and sequence[start] == sequence[end]:
+                return node
+            node = suffix_links[node]
+
+    last = 1
+    for end, base in enumerate(sequence):
+        bit = base_bits.setdefault(base, 1 << len(base_bits))
+        parent = find_extendable(last, end)
+        node = transitions[parent].get(base)
+        if node is None:
+            if lengths[parent] == -1:
+                suffix_link = 1
+            else:
+                suffix_link = transitions[find_extendable(suffix_links[parent], end)][base]
+            node = len(lengths)
+            lengths.append(lengths[parent] + 2)
+            suffix_links.append(suffix_link)
+            transitions.append({})
+            base_masks.append(base_masks[parent] | bit)
+            first_ends.append(end)
+            occurrences.append(0)
+            transitions[parent][base] = node
+        occurrences[node] += 1
+        last = node
+
+    # A palindrome also occurs wherever a longer one it is a suffix of does.
+    # Suffix links always point to earlier nodes, so one reverse pass suffices
+    for node in range(len(lengths) - 1, 1, -1):
+        occurrences[suffix_links[node]] += occurrences[node]
 
+    palindrome_stats: Dict = {"num_palindromes": 0, "palindromes": []}
+    for node in range(2, len(lengths)):
+        if (
+            lengths[node] >= min_substring_len
+            and bin(base_masks[node]).count("1") >= min_bases
+        ):
+            palindrome_stats["palindromes"].append(
+                {
+                    "pos": first_ends[node] - lengths[node] + 1,
+                    "length": lengths[node],
+                    "count": occurrences[node],
+                }
+            )
+    palindrome_stats["num_palindromes"] = len(palindrome_stats["palindromes"])
     return palindrome_stats
 
 
-def find_k_mers(sequence: str, k: int) -> Dict:
+def encode_bases(sequence: Union[str, np.ndarray]) -> Tuple[np.ndarray, int]:
+    """
+    Encodes each base of a DNA sequence as a small integer ID, stored one
+    per byte. Only the bases that actually occur are numbered, so that each
+    needs as few bits as possible when k-mers are packed into integers,
+    e.g. 2 bits for A, C, G, T. IDs follow byte order, so any other bases
+    present still get a unique ID of their own.
+
+    Args:
+        sequence (Union[str, np.ndarray]): The DNA sequence to encode, as a
+        string or as an array from `as_bytes`
+
+    Returns:
+        Tuple[np.ndarray, int]: The uint8 ID of each base, and the number
+        of bits needed to store any one of them
+    """
+    seq_bytes = as_bytes(sequence)
+    present = np.bincount(seq_bytes, minlength=256) > 0
+    lookup = (np.cumsum(present) - 1).astype(np.uint8)
+    bits_per_base = max(1, (int(present.sum()) - 1).bit_length())
+    return lookup[seq_bytes], bits_per_base
+
+
+def format_palindromes(
+    sequence: str, palindrome_stats: Dict, coords_only: bool = False
+) -> Union[Dict, List]:
+    """
+    Formats the palindromes found in a single DNA sequence for reporting
+
+    Args:
+        sequence (str): The DNA sequence the palindromes were found in
+        palindrome_stats (Dict): Output of `find_palindromes` for the sequence
+        coords_only (bool, optional): If True, reports each palindrome as its
+        [position, length], so that no substrings need to be sliced out of
+        the sequence. Defaults to False.
+
+    Returns:
+        Union[Dict, List]: If `coords_only` is False, a mapping of the position
+        of each palindrome to the palindromic sequence. If True, a list of
+        [position, length] pairs
+    """
+    if coords_only:
+        return [[p["pos"], p["length"]] for p in palindrome_stats["palindromes"]]
+    return {
+        p["pos"]: sequence[p["pos"] : p["pos"] + p["length"]]
+        for p in palindrome_stats["palindromes"]
+    }
+
+
+def find_k_mers(
+    sequence: str, k: int, encoded: Union[Tuple[np.ndarray, int], None] = None
+) -> Dict:
     """_summary_
     Finds all substrings of length k (k-mers) of a single DNA
     sequence
@@ -157,29 +451,68 @@ def find_k_mers(sequence: str, k: int) -> Dict:
     Args:
         sequence (str): The DNA sequence to analyse
         k (int): Length of the substring
+        encoded (Tuple[np.ndarray, int], optional): The output of `encode_bases`
+        for this sequence, so that it can be shared between several values
+        of k. If None, the sequence is encoded here, unless it contains
+        non-ASCII characters. Defaults to None.
 
     Returns:
         Dict: A mapping of each K-mer to its count
     """
-    k_mer_stats: Dict = {}
-
-    for substring in substrings(sequence, win_len=k, hop_len=1):
-        if substring not in k_mer_stats.keys():
-            k_mer_stats[substring] = 0
-        k_mer_stats[substring] += 1
-
+    num_k_mers = len(sequence) - k + 1
+    if num_k_mers <= 0:
+        return {}
+
+    if encoded is None and sequence.isascii():
+        encoded = encode_bases(sequence)
+    if encoded is None or encoded[1] * k > 64:
+        # Non-ASCII bases can't be encoded as bytes, and long k-mers can't be
+        # packed into an integer, so count the strings instead
+        k_mer_stats: Dict = {}
+        for i in range(num_k_mers):
+            substring = sequence[i : i + k]
+            k_mer_stats[substring] = k_mer_stats.get(substring, 0) + 1
+        return k_mer_stats
+
+    # Pack every k-mer into a single integer ID, one base at a time
+    base_ids, bits_per_base = encoded
+    num_ids = 1 << (bits_per_base * k)
+    dense = num_ids <= min(DENSE_K_MER_MAX_IDS, DENSE_K_MER_MAX_FILL * num_k_mers)
+    k_mer_ids = np.zeros(num_k_mers, dtype=np.intp if dense else np.uint64)
+    for offset in range(k):
+        k_mer_ids <<= k_mer_ids.dtype.type(bits_per_base)
+        k_mer_ids |= base_ids[offset : offset + num_k_mers]
+
+    # Count the IDs, along with the position where each first appears
+    if dense:
+        # Few enough possible IDs to count them straight into a table,
+        # with no hashing or sorting
+        counts = np.bincount(k_mer_ids, minlength=num_ids)
+        # Unbuffered, so each k-mer keeps the smallest of all its positions
+        first_pos = np.full(num_ids, num_k_mers, dtype=np.intp)
+        np.minimum.at(first_pos, k_mer_ids, np.arange(num_k_mers))
+        found = np.flatnonzero(counts)
+        first_pos, counts = first_pos[found], counts[found]
+    else:
+        _, first_pos, counts = np.unique(k_mer_ids, return_index=True, return_counts=True)
+
+    # Report k-mers in order of first appearance. Each k-mer is only
+    # sliced from the sequence once, at that first position
+    order = np.argsort(first_pos)
+    k_mer_stats = {
+        sequence[pos : pos + k]: count
+        for pos, count in zip(first_pos[order].tolist(), counts[order].tolist())
+    }
     return k_mer_stats
 
 
-def find_top_k_mers(
-    seq_object: Dict, top: int, k: int, per_sequence: bool = False
-) -> List:
+def select_top_k_mers(all_k_mer_stats: List, top: int, per_sequence: bool = False) -> List:
     """
-    Reports the top N K-mers for all the DNA sequences in a
-    given sequence object
+    Reports the top N K-mers from the K-mer counts of a collection
+    of DNA sequences
 
     Args:
-        seq_obj (Dict): Object containing a list of DNA sequences
+        all_k_mer_stats (List): Output of `find_k_mers` for each DNA sequence
         top (int): How many top K-mers to report
         per_sequence (bool, optional): Whether or not to aggregate the results
         of the top K-mers. If True, reports the top N K-mers for each DNA
@@ -193,31 +526,164 @@ def find_top_k_mers(
     """
 
     def get_top_values(d: Dict) -> List:
-        items = list(d.items())
-        # Sort by count of dict values
-        items.sort(key=lambda kv: kv[1], reverse=True)
-        top_n = items[:top]
+        # Keep a heap of only the top N counts rather than sorting them all.
+        # Ties stay in insertion order, as with a stable sort
+        top_n = heapq.nlargest(top, d.items(), key=itemgetter(1))
         return top_n
 
-    all_k_mer_stats = apply_foreach(seq_object, find_k_mers, k=k)
     filtered = []
     if per_sequence:
         for seq_results in all_k_mer_stats:
             k_mer_stats = get_top_values(seq_results)
             filtered.append(k_mer_stats)
     else:
-        aggregated_k_mer_stats: Dict = {}
+        aggregated_k_mer_stats: Counter = Counter()
         for seq_results in all_k_mer_stats:
-            for key, value in seq_results.items():
-                if key not in aggregated_k_mer_stats.keys():
-                    aggregated_k_mer_stats[key] = 0
-                aggregated_k_mer_stats[key] += value
+            aggregated_k_mer_stats.update(seq_results)
         k_mer_stats = get_top_values(aggregated_k_mer_stats)
         filtered.append(k_mer_stats)
     return filtered
 
 
-def apply_foreach(seq_object: Dict, analysis_func: Callable, **kwargs) -> List:
+def find_top_k_mers(
+    seq_object: Dict, top: int, k: int, per_sequence: bool = False
+) -> List:
+    """
+    Reports the top N K-mers for all the DNA sequences in a
+    given sequence object
+
+    Args:
+        seq_obj (Dict): Object containing a list of DNA sequences
+        top (int): How many top K-mers to report
+        per_sequence (bool, optional): Whether or not to aggregate the results
+        of the top K-mers. See `select_top_k_mers`. Defaults to False.
+
+    Returns:
+        List: The top K-mers, as reported by `select_top_k_mers`
+    """
+    all_k_mer_stats = apply_foreach(seq_object, find_k_mers, k=k)
+    return select_top_k_mers(all_k_mer_stats, top=top, per_sequence=per_sequence)
+
+
+def analyse_sequence(sequence: str, settings: Dict) -> Dict:
+    """
+    Runs every per-sequence analysis on a single DNA sequence, so that
+    the whole dataset only has to be visited once. The sequence is
+    converted to bytes and encoded as base IDs once, and these are
+    shared by the analyses that use them.
+
+    Args:
+        sequence (str): The DNA sequence to analyse
+        settings (Dict): Parameters for the analysis run, as loaded
+        from the settings file
+
+    Returns:
+        Dict: The output of each analysis, keyed by the name of the stat
+    """
+    seq_bytes = as_bytes(sequence)
+    # K-mers of non-ASCII sequences are counted as strings instead
+    encoded = encode_bases(seq_bytes) if sequence.isascii() else None
+    valid_bases = settings["valid_nucleobases"]
+    seq_stats = {
+        "palindromes": find_palindromes(
+            sequence,
+            min_substring_len=settings["min_basepair_len"],
+            min_bases=settings["min_bases"],
+        ),
+        "k_mers": {
+            k: find_k_mers(sequence, k=k, encoded=encoded) for k in settings["k_values"]
+        },
+        "gc": get_gc_stats(seq_bytes),
+        "dnt": get_dinucleotide_freqs(seq_bytes, valid_bases=valid_bases),
+        "invalid": find_invalid_bases(sequence, valid_bases=valid_bases),
+    }
+    return seq_stats
+
+
+def _attach_worker(shared_name: str, analysis_func: Callable) -> None:
+    """
+    Initialises a pool worker by attaching it to the shared memory holding
+    the DNA sequences. Runs once per worker process.
+
+    Args:
+        shared_name (str): Name of the shared memory block
+        analysis_func (Callable): The analysis function to apply, with any
+        keyword arguments already bound
+    """
+    _worker_state["shared"] = SharedMemory(name=shared_name)
+    _worker_state["analysis_func"] = analysis_func
+
+
+def _analyse_shared(bounds: Tuple[int, int]) -> Any:
+    """
+    Applies the worker's analysis function to a single DNA sequence
+    read from shared memory.
+
+    Args:
+        bounds (Tuple[int, int]): Start and end offsets of the sequence
+
+    Returns:
+        Any: The DNA stats returned by the analysis function
+    """
+    start, end = bounds
+    sequence = bytes(_worker_state["shared"].buf[start:end]).decode("utf-8")
+    return _worker_state["analysis_func"](sequence)
+
+
+def iterate_foreach(
+    seq_object: Dict, analysis_func: Callable, parallel: bool = False, **kwargs
+) -> Iterator:
+    """
+    Lazy version of `apply_foreach`, which yields the stats for each DNA
+    sequence in order as soon as they are available, so that they can be
+    consumed without keeping the results for the whole dataset in memory.
+
+    Args:
+        seq_obj (Dict): Object containing a list of DNA sequences
+        analysis_func (Callable): A function that applies some analysis to
+        a single DNA sequence
+        parallel (bool, optional): If True, analyses the sequences in a pool
+        of worker processes, one per CPU, which read the sequences from shared
+        memory. `analysis_func` and its keyword arguments must then be
+        picklable. Defaults to False.
+
+    Yields:
+        Iterator: The DNA stats for each sequence, as returned by `analysis_func`
+    """
+    sequences = seq_object["sequences"]
+    if parallel:
+        if not sequences:
+            return
+        # Put the whole dataset in shared memory once, so that workers only
+        # need to be sent the bounds of each sequence rather than the bases
+        encoded_seqs = [seq.encode("utf-8") for seq in sequences]
+        seq_ends = np.cumsum([len(seq) for seq in encoded_seqs]).tolist()
+        seq_bounds = zip([0] + seq_ends[:-1], seq_ends)
+        shared = SharedMemory(create=True, size=max(1, seq_ends[-1]))
+        try:
+            shared.buf[: seq_ends[-1]] = b"".join(encoded_seqs)
+            del encoded_seqs
+            num_workers = os.cpu_count() or 1
+            # Hand each worker several sequences at a time to amortise pickling
+            chunksize = max(1, len(sequences) // (4 * num_workers))
+            with ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_attach_worker,
+                initargs=(shared.name, partial(analysis_func, **kwargs)),
+            ) as executor:
+                yield from executor.map(_analyse_shared, seq_bounds, chunksize=chunksize)
+        finally:
+            shared.close()
+            shared.unlink()
+        return
+
+    for seq in sequences:
+        yield analysis_func(seq, **kwargs)
+
+
+def apply_foreach(
+    seq_object: Dict, analysis_func: Callable, parallel: bool = False, **kwargs
+) -> List:
     """
     Utility function that applies a given analysis function to a
     collection of DNA sequences. Can pass in keyword arguments
@@ -227,84 +693,88 @@ def apply_foreach(seq_object: Dict, analysis_func: Callable, **kwargs) -> List:
         seq_obj (Dict): Object containing a list of DNA sequences
         analysis_func (Callable): A function that applies some analysis to
         a single DNA sequence
+        parallel (bool, optional): If True, analyses the sequences in a pool
+        of worker processes, one per CPU. `analysis_func` and its keyword
+        arguments must then be picklable. Defaults to False.
 
     Returns:
         List: A collection of DNA stats relevant to whatever analysis function was
         passed to `analysis_func`
     """
-    stats: List = []
-    for seq in seq_object["sequences"]:
-        seq_stats = analysis_func(seq, **kwargs)
-        stats.append(seq_stats)
+    stats: List = list(
+        iterate_foreach(seq_object, analysis_func, parallel=parallel, **kwargs)
+    )
     return stats
 
 
-def find_max(stats: List, field: str) -> Tuple[int, Dict]:
+def stat_columns(stats: List) -> Dict[str, np.ndarray]:
+    """
+    Gathers the values of every field from every entry into one array
+    per field, so that each field can be reduced in a single operation.
+    Assumes every entry has the same fields as the first
+
+    Args:
+        stats (List): Collection of stat objects
+
+    Returns:
+        Dict[str, np.ndarray]: The value of each field for every entry,
+        in order
+    """
+    return {
+        field: np.fromiter(map(itemgetter(field), stats), dtype=np.float64, count=len(stats))
+        for field in stats[0].keys()
+    }
+
+
+def find_max(stats: List, column: np.ndarray) -> Tuple[int, Dict]:
     """
     Finds the entry with the maximum value for a given field.
-    Throws KeyError if field is not found in the stat dict
 
     Args:
         stats (List): Collection of stat objects
-        field (str): Field of interest within the object
+        column (np.ndarray): Field of interest for every object, as
+        returned by `stat_columns`
 
     Returns:
         Tuple[int, Dict]: The position where the max value was found, and the
         maximum value object itself
     """
-    max_index = 0
-    max_value = float("-inf")
-    ret_dict = stats[0]
-    for i, stats_dict in enumerate(stats):
-        if stats_dict[field] > max_value:
-            max_value = stats_dict[field]
-            ret_dict = stats[i]
-            max_index = i
-    return max_index, ret_dict
+    max_index = int(column.argmax())
+    return max_index, stats[max_index]
 
 
-def find_min(stats: List, field: str) -> Tuple[int, Dict]:
+def find_min(stats: List, column: np.ndarray) -> Tuple[int, Dict]:
     """
     Finds the entry with the minimum value for a given field.
-    Throws KeyError if field is not found in the stat dict
 
     Args:
         stats (List): Collection of stat objects
-        field (str): Field of interest within the object
+        column (np.ndarray): Field of interest for every object, as
+        returned by `stat_columns`
 
     Returns:
         Tuple[int, Dict]: The position where the min value was found, 
         and the minimum value object itself
     """
-    min_index = 0
-    min_value = float("inf")
-    ret_dict = stats[0]
-    for i, stats_dict in enumerate(stats):
-        if stats_dict[field] < min_value:
-            min_value = stats_dict[field]
-            ret_dict = stats[i]
-            min_index = i
-    return min_index, ret_dict
+    min_index = int(column.argmin())
+    return min_index, stats[min_index]
 
 
-def reduce_avg(stats: List) -> Dict:
+def reduce_avg(columns: Dict[str, np.ndarray]) -> Dict:
     """
     Averages all the stats for a given collection of results.
 
     Args:
-        stats (List): Output of the `apply_foreach` function. A list of
-        stats pertaining to a collection of DNA sequences
+        columns (Dict[str, np.ndarray]): Stats pertaining to a collection
+        of DNA sequences, as returned by `stat_columns`
 
     Returns:
         Dict: The average values of all the DNA sequences for each
         field in the analysis
     """
-    aggregated: Dict = {key: 0.0 for key, val in stats[0].items()}
-    for stats_dict in stats:
-        for key, value in stats_dict.items():
-            aggregated[key] += value
-
-    aggregated = {key: val / len(stats) for key, val in aggregated.items()}
+    # Stack the columns so every field is averaged in one operation
+    means = np.stack(list(columns.values())).mean(axis=1)
+    aggregated = dict(zip(columns.keys(), means.tolist()))
     return aggregated
 
 
@@ -330,6 +800,18 @@ def parse_args(args: List[str]) -> argparse.Namespace:
         action="store_true",
         help="Parameter used in the top-N k-mer analysis. If set, calculates top N k-mers for each DNA sequence separately",
     )
+    parser.add_argument(
+        "-j",
+        "--parallel",
+        action="store_true",
+        help="If set, analyses the DNA sequences in a pool of worker processes, one per CPU. Only worthwhile for large datasets.",
+    )
+    parser.add_argument(
+        "-c",
+        "--coords-only",
+        action="store_true",
+        help="If set, reports each palindrome as its [position, length] rather than mapping its position to the palindromic sequence",
+    )
     parser.add_argument(
         "-o",
         "--out-dir",
@@ -358,28 +840,31 @@ if __name__ == "__main__":
         
     SETTINGS = load_json(run_args.settings_file)
     seq_object = load_json(run_args.seq_file)
-
-    # Palindromic substrings over 20 bases long that contain at least 3 bases
-    print("Finding palindromes...", end='', flush=True)
-    all_palindrome_stats = apply_foreach(
-        seq_object,
-        find_palindromes,
-        min_substring_len=SETTINGS["min_basepair_len"],
-        min_bases=SETTINGS["min_bases"],
-    )
-    seq_dict: Dict = {}
-    for i, stats in enumerate(all_palindrome_stats):
-        if stats["num_palindromes"] > 0:
-            palindromes = [
-                (
-                    p["pos"],
-                    seq_object["sequences"][i][p["pos"] : p["pos"] + p["length"]],
+    seqs = tuple(seq_object["sequences"])
+
+    # Run every analysis in a single pass over the dataset
+    print("Analysing sequences...", end='', flush=True)
+    all_seq_stats: List = []
+    with stream_json(f"{run_args.out_dir}/palindrome_stats.json") as save_palindromes:
+        for i, seq_stats in enumerate(
+            iterate_foreach(
+                seq_object,
+                analyse_sequence,
+                parallel=run_args.parallel,
+                settings=SETTINGS,
+            )
+        ):
+            # Palindromic substrings over 20 bases long that contain at least 3 bases.
+            # There can be very many of these, so save them straight away
+            stats = seq_stats.pop("palindromes")
+            if stats["num_palindromes"] > 0:
+                save_palindromes(
+                    i,
+                    format_palindromes(
+                        seqs[i], stats, coords_only=run_args.coords_only
+                    ),
                 )
-                for p in stats["palindromes"]
-            ]
-            palindrome_dict = {pos: palindrome for pos, palindrome in palindromes}
-            seq_dict[i] = palindrome_dict
-    save_json(f"{run_args.out_dir}/palindrome_stats.json", seq_dict)
+            all_seq_stats.append(seq_stats)
     print("done")
 
     # Find k-mers both per-sequence and overall
@@ -390,8 +875,10 @@ if __name__ == "__main__":
     )
     k_mer_dict: Dict = {}
     for k in SETTINGS["k_values"]:
-        per_seq_k_mers = find_top_k_mers(
-            seq_object, top=SETTINGS["top_n"], k=k, per_sequence=run_args.per_seq_k_mer
+        per_seq_k_mers = select_top_k_mers(
+            [s["k_mers"][k] for s in all_seq_stats],
+            top=SETTINGS["top_n"],
+            per_sequence=run_args.per_seq_k_mer,
         )
         k_mer_dict[f"{k}_mers"] = per_seq_k_mers
     save_json(
@@ -402,35 +889,36 @@ if __name__ == "__main__":
 
     # GC content stats
     print("Finding GC stats...", end='', flush=True)
-    all_gc_stats = apply_foreach(seq_object, get_gc_stats)
+    all_gc_stats = [s["gc"] for s in all_seq_stats]
+    gc_columns = stat_columns(all_gc_stats)
     gc_dict = {
-        "avg_gc": reduce_avg(all_gc_stats),
-        "max_gc_dist": find_max(all_gc_stats, "gc_distribution"),
-        "max_gc_skew": find_max(all_gc_stats, "gc_skew"),
-        "min_gc_dist": find_min(all_gc_stats, "gc_distribution"),
-        "min_gc_skew": find_min(all_gc_stats, "gc_skew"),
+        "avg_gc": reduce_avg(gc_columns),
+        "max_gc_dist": find_max(all_gc_stats, gc_columns["gc_distribution"]),
+        "max_gc_skew": find_max(all_gc_stats, gc_columns["gc_skew"]),
+        "min_gc_dist": find_min(all_gc_stats, gc_columns["gc_distribution"]),
+        "min_gc_skew": find_min(all_gc_stats, gc_columns["gc_skew"]),
     }
     save_json(f"{run_args.out_dir}/gc_stats.json", gc_dict)
     print("done")
 
     # Dinucleotide frequencies
     print("Calculating dinucleotide stats...", end='', flush=True)
-    all_dinucleotide_stats = apply_foreach(seq_object, get_dinucleotide_freqs, valid_bases=SETTINGS["valid_nucleobases"])
+    all_dinucleotide_stats = [s["dnt"] for s in all_seq_stats]
     dnt_dict: Dict[str, Any] = {
         "all_dnt_stats": all_dinucleotide_stats,
-        "avg_dnt": reduce_avg(all_dinucleotide_stats),
+        "avg_dnt": reduce_avg(stat_columns(all_dinucleotide_stats)),
     }
     save_json(f"{run_args.out_dir}/dnt_stats.json", dnt_dict)
     print("done")
 
     # Sequences with errors in them, maybe? Assuming only A, C, G, T are valid bases
     print("Searching for invalid sequences...", end='', flush=True)
-    all_invalid_stats = apply_foreach(seq_object, find_invalid_bases, valid_bases=SETTINGS["valid_nucleobases"])
     invalid_dict: Dict = {}
-    for i, stat in enumerate(all_invalid_stats):
+    for i, seq_stats in enumerate(all_seq_stats):
+        stat = seq_stats["invalid"]
         if stat["num_invalid"] > 0:
             invalid_bases = [
-                (s["pos"], seq_object["sequences"][i][s["pos"]])
+                (s["pos"], seqs[i][s["pos"]])
                 for s in stat["invalid_bases"]
             ]
             invalid_dict[i] = {pos: invalid_base for pos, invalid_base in invalid_bases}
@@ -1,6 +1,21 @@
+import json
+import os
+import tempfile
 import unittest
+from collections import Counter
 
-from main import find_palindromes, find_top_k_mers, find_invalid_bases
+from main import (
+    manacher,
+    find_palindromes,
+    find_distinct_palindromes,
+    format_palindromes,
+    find_top_k_mers,
+    find_invalid_bases,
+    find_k_mers,
+    apply_foreach,
+    analyse_sequence,
+)
+from utils import get_colours, seq_to_img, save_json, stream_json
 
 
 VALID_BASES = ["A", "B", "C"]
@@ -73,6 +88,63 @@ class TestPalindromes(unittest.TestCase):
         )
         self.assertEqual(palindromes["num_palindromes"], 1)
 
+    def test_manacher_radii(self):
+        # ABACACBBCA: ABA at 0, ACA at 2, CAC at 3, BB at 6, ACBBCA at 4
+        d1, d2 = manacher(TOY_DATASET["sequences"][4])
+        self.assertEqual(d1, [1, 2, 1, 2, 2, 1, 1, 1, 1, 1])
+        self.assertEqual(d2, [0, 0, 0, 0, 0, 0, 0, 3, 0, 0])
+
+    def test_distinct_palindromes(self):
+        # Every palindrome occurrence should be counted under its distinct string
+        idx_to_check = 4
+        seq = TOY_DATASET["sequences"][idx_to_check]
+        palindromes = find_palindromes(
+            seq, min_substring_len=self.min_length, min_bases=self.min_diversity
+        )
+        distinct = find_distinct_palindromes(
+            seq, min_substring_len=self.min_length, min_bases=self.min_diversity
+        )
+        expected = Counter(
+            seq[p["pos"] : p["pos"] + p["length"]] for p in palindromes["palindromes"]
+        )
+        found = {
+            seq[p["pos"] : p["pos"] + p["length"]]: p["count"]
+            for p in distinct["palindromes"]
+        }
+        self.assertEqual(found, dict(expected))
+
+    def test_distinct_palindrome_counts(self):
+        # ABA repeats and sits inside longer palindromes such as ABACABA,
+        # so its count must include those occurrences too
+        seq = "ABACABACABA"
+        distinct = find_distinct_palindromes(seq, min_substring_len=3, min_bases=2)
+        found = {
+            seq[p["pos"] : p["pos"] + p["length"]]: (p["pos"], p["count"])
+            for p in distinct["palindromes"]
+        }
+        self.assertEqual(
+            found,
+            {
+                "ABA": (0, 3),
+                "ACA": (2, 2),
+                "BACAB": (1, 2),
+                "ABACABA": (0, 2),
+                "CABAC": (3, 1),
+                "ACABACA": (2, 1),
+                "BACABACAB": (1, 1),
+                "ABACABACABA": (0, 1),
+            },
+        )
+
+    def test_format_palindromes(self):
+        # ACBBCA at pos 4 is the only palindrome of length > 5 in this sequence
+        seq = TOY_DATASET["sequences"][4]
+        palindromes = find_palindromes(seq, min_substring_len=5, min_bases=2)
+        self.assertEqual(format_palindromes(seq, palindromes), {4: "ACBBCA"})
+        self.assertEqual(
+            format_palindromes(seq, palindromes, coords_only=True), [[4, 6]]
+        )
+
 
 class TestInvalid(unittest.TestCase):
 
@@ -89,6 +161,12 @@ class TestInvalid(unittest.TestCase):
         invalid = find_invalid_bases(seq, valid_bases=VALID_BASES)
         self.assertEqual(invalid["num_invalid"], 1)
 
+    def test_invalid_long_sequence(self):
+        # Long sequences are scanned with NumPy rather than a regex
+        seq = "ABC" * 1000 + "X" + "ABC" * 1000
+        invalid = find_invalid_bases(seq, valid_bases=VALID_BASES)
+        self.assertEqual(invalid["invalid_bases"], [{"pos": 3000, "base": "X"}])
+
 
 class TestKMers(unittest.TestCase):
     def setUp(self) -> None:
@@ -117,6 +195,99 @@ class TestKMers(unittest.TestCase):
         self.assertEqual(len(per_seq_k_mers[1]), 2)
         self.assertEqual(len(per_seq_k_mers[2]), 2)
 
+    def test_non_ascii_k_mers(self):
+        k_mers = find_k_mers("ACGTAÑGT", k=3)
+        self.assertEqual(k_mers["TAÑ"], 1)
+        self.assertEqual(sum(k_mers.values()), 6)
+
+
+class TestApplyForeach(unittest.TestCase):
+    def test_parallel_matches_serial(self):
+        serial = apply_foreach(TOY_DATASET, find_k_mers, k=3)
+        parallel = apply_foreach(TOY_DATASET, find_k_mers, parallel=True, k=3)
+        self.assertEqual(parallel, serial)
+
+
+
+class TestAnalyseSequence(unittest.TestCase):
+    def setUp(self) -> None:
+        self.settings = {
+            "valid_nucleobases": VALID_BASES,
+            "min_basepair_len": 3,
+            "min_bases": 2,
+            "k_values": [3],
+        }
+
+    def test_non_ascii_base(self):
+        # A non-ASCII character should be reported as an invalid base,
+        # without stopping the other analyses
+        stats = analyse_sequence("ABCBAÑBC", settings=self.settings)
+        self.assertEqual(stats["invalid"]["invalid_bases"], [{"pos": 5, "base": "Ñ"}])
+        self.assertEqual(stats["k_mers"][3]["AÑB"], 1)
+        self.assertEqual(stats["dnt"]["AB"], 1 / 3)
+        self.assertEqual(stats["palindromes"]["num_palindromes"], 2)
+
+    def test_non_ascii_parallel(self):
+        seq_object = {"sequences": ["ABCBAÑBC", "ABC"]}
+        serial = apply_foreach(seq_object, analyse_sequence, settings=self.settings)
+        parallel = apply_foreach(
+            seq_object, analyse_sequence, parallel=True, settings=self.settings
+        )
+        self.assertEqual(parallel, serial)
+
+
+class TestSeqToImg(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bases = VALID_BASES + ["X"]
+        self.colours = get_colours(len(self.bases))
+
+    def test_invalid_bases_use_error_colour(self):
+        image = seq_to_img(["ABX", "CÑA"], self.colours, self.bases)
+        self.assertEqual(image.shape, (2, 3, 3))
+        self.assertEqual(image[0, 2].tolist(), self.colours[3])
+        self.assertEqual(image[1, 1].tolist(), self.colours[3])
+
+    def test_ragged_sequences(self):
+        # Lengths add up to a 3x3 image, but the sequences can't be stacked
+        with self.assertRaises(ValueError):
+            seq_to_img(["AAA", "C", "BBBBB"], self.colours, self.bases)
+
+
+class TestStreamJson(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.streamed_path = os.path.join(tmp_dir.name, "streamed.json")
+        self.saved_path = os.path.join(tmp_dir.name, "saved.json")
+
+    def assert_same_as_saved(self, obj):
+        with stream_json(self.streamed_path) as write_entry:
+            for key, value in obj.items():
+                write_entry(key, value)
+        save_json(self.saved_path, obj)
+
+        with open(self.streamed_path) as fh:
+            streamed = json.load(fh)
+        with open(self.saved_path) as fh:
+            saved = json.load(fh)
+        self.assertEqual(streamed, saved)
+
+    def test_entries(self):
+        self.assert_same_as_saved({
+            "0": [[0, 3, "ABA"], [4, 8, "CBAABC"]],
+            "1": {"nested": [1.5, None, True]},
+            "2": [],
+        })
+
+    def test_empty(self):
+        self.assert_same_as_saved({})
+
+    def test_error_leaves_no_file(self):
+        with self.assertRaises(RuntimeError):
+            with stream_json(self.streamed_path) as write_entry:
+                write_entry("0", [1, 2, 3])
+                raise RuntimeError("analysis failed")
+        self.assertEqual(os.listdir(os.path.dirname(self.streamed_path)), [])
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,11 +1,21 @@
+import os
 import json
 import colorsys
-from typing import List, Dict
+from contextlib import contextmanager
+from typing import List, Dict, Callable, Iterator, Union
 
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.colors import ListedColormap, BoundaryNorm
 
+try:
+    import orjson
+except ImportError:  # Optional, fall back to the standard library serialiser
+    orjson = None
+
+# Figure shared by every plot, created on first use
+_figure: Union[Figure, None] = None
+
 
 def get_colours(n: int) -> List:
     """
@@ -46,20 +56,38 @@ def seq_to_img(sequences: List, colours: List, bases: List) -> np.ndarray:
     Returns:
         np.ndarray: The NxLx3 array which can be plotted
     """
-    colour_lookup = {base: colour for base, colour in zip(bases, colours)}
+    # Map every byte value to a colour index, with invalid bases
+    # using the reserved error key
+    colour_index = np.full(256, bases.index("X"), dtype=np.uint8)
+    for i, base in enumerate(bases):
+        colour_index[ord(base)] = i
 
-    rows = []
-    for seq in sequences:
-        row = []
-        for base in seq:
-            try:
-                row.append(colour_lookup[base])
-            except KeyError:
-                # invalid base found, use reserved error key
-                row.append(colour_lookup["X"])
-        rows.append(row)
+    seq_len = len(sequences[0])
+    if any(len(seq) != seq_len for seq in sequences):
+        raise ValueError("All DNA sequences must be the same length to be drawn")
 
-    return np.array(rows)
+    # Any character outside Latin-1 becomes "?", keeping one byte per base
+    seq_text = "".join(sequences).encode("latin-1", errors="replace")
+    seq_bytes = np.frombuffer(seq_text, dtype=np.uint8).reshape(len(sequences), seq_len)
+
+    return np.asarray(colours)[colour_index[seq_bytes]]
+
+
+def get_figure() -> Figure:
+    """
+    Returns a blank figure to draw a plot on. The same figure is cleared
+    and reused for every plot, rather than a new one being created (and
+    kept alive by pyplot) each time. It is not attached to any GUI, so
+    plots are rendered offline.
+
+    Returns:
+        Figure: The shared figure, with nothing drawn on it
+    """
+    global _figure
+    if _figure is None:
+        _figure = Figure()
+    _figure.clf()
+    return _figure
 
 
 def plot_dna_dataset(seq_obj: Dict, bases: List, outfile: str) -> None:
@@ -77,11 +105,12 @@ def plot_dna_dataset(seq_obj: Dict, bases: List, outfile: str) -> None:
     custom_cmap = ListedColormap(colours)
     dna_image = seq_to_img(sequences, colours, bases)
     norm = BoundaryNorm(np.arange(len(bases) + 1) - 0.5, len(bases))
-    plt.imshow(dna_image, cmap=custom_cmap, norm=norm)
-    cbar = plt.colorbar(ticks=np.arange(len(bases)), label="Nucleobases")
+    fig = get_figure()
+    ax = fig.add_subplot()
+    image = ax.imshow(dna_image, cmap=custom_cmap, norm=norm)
+    cbar = fig.colorbar(image, ax=ax, ticks=np.arange(len(bases)), label="Nucleobases")
     cbar.ax.set_yticklabels(bases)
-    plt.savefig(outfile, dpi=300, bbox_inches="tight", format="png")
-    plt.cla()
+    fig.savefig(outfile, dpi=300, bbox_inches="tight", format="png")
 
 
 def plot_dnt_confmat(dnt_stats: Dict, bases: List, outfile: str) -> None:
@@ -96,20 +125,19 @@ def plot_dnt_confmat(dnt_stats: Dict, bases: List, outfile: str) -> None:
     num_bases = len(bases)
     values = np.array(list(dnt_stats.values()))
     confmat = values.reshape(num_bases, num_bases)
-    fig, ax = plt.subplots()
-    for i in range(confmat.shape[0]):
-        for j in range(confmat.shape[1]):
-            ax.text(
-                j, i, f"{confmat[i, j]:.4f}", ha="center", va="center", color="white"
-            )
+    # Format every label in one go rather than once per cell
+    labels = np.char.mod("%.4f", confmat)
+    fig = get_figure()
+    ax = fig.add_subplot()
+    for (i, j), label in np.ndenumerate(labels):
+        ax.text(j, i, label, ha="center", va="center", color="white")
 
     ax.set_xticks(np.arange(num_bases))
     ax.set_yticks(np.arange(num_bases))
     ax.set_xticklabels(bases)
     ax.set_yticklabels(bases)
     ax.imshow(confmat)
-    plt.savefig(outfile, dpi=300, bbox_inches="tight", format="png")
-    plt.cla()
+    fig.savefig(outfile, dpi=300, bbox_inches="tight", format="png")
 
 
 def load_json(path: str) -> Dict:
@@ -125,6 +153,27 @@ def load_json(path: str) -> Dict:
     return loaded
 
 
+def to_json_bytes(obj: object, indent: bool = True) -> bytes:
+    """
+    Serialises an object to JSON, using `orjson` if it is installed as it
+    is considerably faster than the standard library for large results
+
+    Args:
+        obj (object): Object to serialise
+        indent (bool, optional): Whether to pretty-print the JSON. Defaults to True.
+
+    Returns:
+        bytes: The UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    # Match orjson's output, so results are the same whichever is installed
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
 def save_json(path: str, obj: object) -> None:
     """
     Convenience function for saving JSON
@@ -133,6 +182,42 @@ def save_json(path: str, obj: object) -> None:
         path (str): JSON file's save path
         obj (Dict): Object to serialise
     """
-    with open(path, "w") as fh:
-        json.dump(obj, fh, indent=4)
- 
\ No newline at end of file
+    with open(path, "wb") as fh:
+        fh.write(to_json_bytes(obj))
+
+
+@contextmanager
+def stream_json(path: str) -> Iterator[Callable[[object, object], None]]:
+    """
+    Convenience function for saving a JSON object one entry at a time,
+    so that large results never have to be held in memory all at once.
+    Each entry is written on its own line as soon as it is available.
+    Entries go to a temporary file which only replaces the save path
+    once the object is complete, so a failure part way through never
+    leaves truncated JSON behind.
+
+    Args:
+        path (str): JSON file's save path
+
+    Yields:
+        Callable: Function taking a key and a value, which writes them
+        as the next entry of the JSON object
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            fh.write(b"{")
+            separator = b"\n  "
+
+            def write_entry(key: object, value: object) -> None:
+                nonlocal separator
+                fh.write(separator)
+                fh.write(to_json_bytes(str(key)) + b": " + to_json_bytes(value, indent=False))
+                separator = b",\n  "
+
+            yield write_entry
+            fh.write(b"\n}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)